@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Time render() over the real text, with and without the plain text fast path.
+
+Also checks that both produce exactly the same output, and reports how many
+messages took the fast path. Run from this directory after
+extract_textdump.py (or build_textdump.py --write-intermediate).
+"""
+
+import contextlib
+import io
+import json
+import sys
+import time
+
+import render_textdump
+
+
+def main() -> None:
+    try:
+        with open("lang.json", encoding="utf-8") as f:
+            lang = json.load(f)
+    except FileNotFoundError:
+        print("Note: lang.json not found, only measuring Korean.", file=sys.stderr)
+        lang = {}
+    render_textdump.add_korean(lang)
+
+    messages = [
+        (text, msgid, lang_code)
+        for chapter in lang.values()
+        for lang_code, chapter_text in chapter.items()
+        for msgid, text in chapter_text.items()
+        if msgid != "date"
+    ]
+
+    # Both paths warn about the same odd messages, once is enough.
+    with contextlib.redirect_stderr(io.StringIO()):
+        start = time.perf_counter()
+        fast = [render_textdump.render(*message) for message in messages]
+        fast_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        slow = [render_textdump.render(*message, fast_path=False) for message in messages]
+        slow_time = time.perf_counter() - start
+
+    mismatches = [
+        (message, a, b)
+        for message, a, b in zip(messages, fast, slow)
+        if a != b
+    ]
+    for (text, msgid, lang_code), a, b in mismatches[:10]:
+        print(f"Mismatch in {lang_code}:{msgid}: {text!r} -> {a!r} != {b!r}")
+
+    hits = sum(
+        1
+        for text, msgid, _ in messages
+        if text and render_textdump.plain_body(text, msgid) is not None
+    )
+    print(f"{len(messages)} messages, {hits} ({hits / len(messages):.1%}) on the fast path")
+    print(f"fast path: {fast_time * 1000:.0f} ms")
+    print(f"full loop: {slow_time * 1000:.0f} ms ({slow_time / fast_time:.1f}x)")
+    if mismatches:
+        print(f"{len(mismatches)} mismatches!")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
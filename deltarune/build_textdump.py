@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""Run extract_textdump.py and render_textdump.py in one go.
+
+The extracted text and sourcemap are handed straight to the render stage
+instead of going through lang.json and sourcemap.json, which are only
+written with --write-intermediate.
+
+Each stage's inputs and outputs are fingerprinted in .build_state.json, and
+a stage whose inputs haven't changed since the last run is skipped. The
+extracted text is also kept in .build_extract.json, so editing 1.json-4.json
+(the usual case) only reruns the render stage.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import sys
+import typing
+
+import extract_textdump
+import render_textdump
+
+ROOT = pathlib.Path(__file__).resolve().parent
+STATE_FILE = pathlib.Path(".build_state.json")
+EXTRACT_CACHE = pathlib.Path(".build_extract.json")
+KO_FILES = [pathlib.Path(f"{chap}.json") for chap in ["1", "2", "3", "4"]]
+RENDER_OUTPUTS = [
+    pathlib.Path(name)
+    for name in [
+        "rendered.json",
+        "rendered.json.js",
+        "layout.json",
+        "DELTARUNE.txt",
+        "DELTARUNE_ja.txt",
+        "DELTARUNE_ko.txt",
+    ]
+]
+
+
+def hash_files(paths: typing.Iterable[pathlib.Path]) -> str:
+    """Fingerprints file contents. Missing files count as empty."""
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(str(path).encode() + b"\0")
+        try:
+            h.update(hashlib.sha256(path.read_bytes()).digest())
+        except FileNotFoundError:
+            h.update(b"missing")
+    return h.hexdigest()
+
+
+def hash_tree(root: pathlib.Path) -> str:
+    """Fingerprints a directory by file names, sizes and modification times.
+
+    CodeEntries has tens of thousands of files, reading them all just to
+    find out nothing changed would defeat the point.
+    """
+    h = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            stat = os.stat(os.path.join(dirpath, name))
+            h.update(f"{dirpath}/{name}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode())
+    return h.hexdigest()
+
+
+def hash_data(*data: typing.Any) -> str:
+    # sort_keys to match lang.json, so the same data loaded back from it
+    # (with string keys) fingerprints the same as straight from extract().
+    as_json = json.dumps(data, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(as_json.encode()).hexdigest()
+
+
+def hash_values(*values: str) -> str:
+    return hashlib.sha256("\0".join(values).encode()).hexdigest()
+
+
+def extract_inputs(source: pathlib.Path, snippets: int | None) -> str:
+    parts = [
+        hash_files([ROOT / "extract_textdump.py", ROOT / "snippet_store.py"]),
+        str(snippets),
+    ]
+    for n in extract_textdump.CHAPTERS:
+        path = source / str(n)
+        parts.append(
+            hash_files([path / "lang" / "lang_ja.json", path / "lang" / "lang_en.json"])
+        )
+        parts.append(hash_tree(path / "CodeEntries"))
+    return hash_values(*parts)
+
+
+def snippet_files(snippets: int | None) -> list[pathlib.Path]:
+    if snippets is None:
+        return []
+    return [
+        pathlib.Path(extract_textdump.snippet_store.BIN_NAME),
+        pathlib.Path(extract_textdump.snippet_store.INDEX_NAME),
+    ]
+
+
+def load_intermediate(fingerprint: str) -> tuple[dict, dict] | None:
+    """Loads lang.json and sourcemap.json if they match the fingerprint."""
+    try:
+        with open("lang.json", encoding="utf-8") as f:
+            text = json.load(f)
+        with open("sourcemap.json", encoding="utf-8") as f:
+            sourcemap = json.load(f)
+    except FileNotFoundError:
+        return None
+    if hash_data(text, sourcemap) != fingerprint:
+        return None
+    return text, sourcemap
+
+
+def load_cached(fingerprint: str) -> tuple[dict, dict] | None:
+    """Loads the last extract() result if it matches the fingerprint."""
+    try:
+        with open(EXTRACT_CACHE, encoding="utf-8") as f:
+            text, sourcemap = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if hash_data(text, sourcemap) != fingerprint:
+        return None
+    return text, sourcemap
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("source", type=pathlib.Path, metavar="path/to/deltarune")
+    parser.add_argument(
+        "--write-intermediate",
+        action="store_true",
+        help="also write lang.json and sourcemap.json",
+    )
+    parser.add_argument(
+        "--snippets",
+        type=int,
+        metavar="N",
+        help="also write snippets.bin/snippets.json, see extract_textdump.py",
+    )
+    parser.add_argument(
+        "--sqlite",
+        metavar="PATH",
+        help="also write a SQLite database, see render_textdump.py",
+    )
+    parser.add_argument(
+        "--size-report",
+        metavar="PATH",
+        help="also write a size breakdown, see render_textdump.py",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="rerun every stage regardless"
+    )
+    args = parser.parse_args()
+
+    try:
+        state = json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        state = {}
+    if args.force:
+        state = {}
+
+    def run_extract() -> tuple[dict, dict]:
+        text, sourcemap, offsets = extract_textdump.extract(args.source)
+        if args.write_intermediate:
+            extract_textdump.write_lang(text, sourcemap)
+        if args.snippets is not None:
+            extract_textdump.write_snippets(args.source, sourcemap, offsets, args.snippets)
+        with open(EXTRACT_CACHE, "w", encoding="utf-8") as f:
+            json.dump([text, sourcemap], f, ensure_ascii=False, separators=(",", ":"))
+        state["extract"] = {
+            "inputs": inputs,
+            "outputs": hash_data(text, sourcemap),
+            "files": hash_files(snippet_files(args.snippets)),
+        }
+        return text, sourcemap
+
+    data = None
+    inputs = extract_inputs(args.source, args.snippets)
+    previous = state.get("extract", {})
+    up_to_date = (
+        previous.get("inputs") == inputs
+        and previous.get("files") == hash_files(snippet_files(args.snippets))
+    )
+    if up_to_date and args.write_intermediate:
+        # Asked for lang.json, so it had better be there.
+        data = load_intermediate(previous["outputs"])
+        if data is None:
+            data = load_cached(previous["outputs"])
+            if data is not None:
+                print("extract: writing lang.json from cache", file=sys.stderr)
+                extract_textdump.write_lang(*data)
+        up_to_date = data is not None
+    if up_to_date:
+        print("extract: up to date", file=sys.stderr)
+    else:
+        print("extract: running", file=sys.stderr)
+        data = run_extract()
+
+    render_inputs = hash_values(
+        state["extract"]["outputs"],
+        hash_files([ROOT / "render_textdump.py", *KO_FILES]),
+        str(args.sqlite),
+        str(args.size_report),
+    )
+    render_outputs = RENDER_OUTPUTS + [
+        pathlib.Path(path) for path in [args.sqlite, args.size_report] if path
+    ]
+    previous = state.get("render", {})
+    if (
+        previous.get("inputs") == render_inputs
+        and previous.get("outputs") == hash_files(render_outputs)
+    ):
+        print("render: up to date", file=sys.stderr)
+    else:
+        print("render: running", file=sys.stderr)
+        if data is None:
+            data = load_cached(state["extract"]["outputs"])
+        if data is None:
+            data = load_intermediate(state["extract"]["outputs"])
+        if data is None:
+            print("extract: cached text is gone, running anyway", file=sys.stderr)
+            data = run_extract()
+        text, sourcemap = data
+        # Same shape as after a round trip through JSON
+        lang = {str(n): chapter for n, chapter in text.items()}
+        chapter_sourcemap = {str(n): chapter for n, chapter in sourcemap.items()}
+        render_textdump.add_korean(lang)
+        rendered = render_textdump.render_all(lang, chapter_sourcemap)
+        render_textdump.write_rendered(rendered)
+        render_textdump.write_layout(rendered)
+        if args.sqlite:
+            render_textdump.write_sqlite(args.sqlite, rendered, lang, chapter_sourcemap)
+        if args.size_report:
+            render_textdump.write_size_report(args.size_report, rendered, chapter_sourcemap)
+        state["render"] = {
+            "inputs": render_inputs,
+            "outputs": hash_files(render_outputs),
+        }
+
+    STATE_FILE.write_text(json.dumps(state, indent=1), encoding="utf-8")
+    print("Text dump successfully generated.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""Find lines of Korean text that are too wide for the textbox.
+
+Uses the advance widths of the bundled 13px bitmap fonts rather than
+assuming every character is the same width, so it works for Hangul, ASCII
+and everything in between. Run from this directory, like the other scripts.
+"""
+
+import argparse
+import array
+import functools
+import itertools
+import json
+import pathlib
+import re
+import struct
+import sys
+import typing
+
+import render_textdump
+
+ROOT = pathlib.Path(__file__).resolve().parent
+DEFAULT_FONT = ROOT.parent / "gulim-13px.ttf"
+CACHE_DIR = ROOT / ".cache"
+FONT_SIZE = 13
+# div.textbox in dialogue.css, i.e. 33 columns of the 8px English font plus a
+# pixel, which is what the dialogue box fits. Korean glyphs vary too much in
+# width to count columns instead: "A" is 8px in gulim but 7px in gungsuh, "i"
+# is 3px and 5px.
+TEXTBOX_WIDTH = 265
+# Text that isn't drawn in the dialogue box: item, weapon, armor, key item and
+# recruit descriptions, menus, and debug text the game never shows.
+NOT_TEXTBOX_PREFIXES = (
+    "scr_itemdesc",
+    "scr_weaponinfo",
+    "scr_armorinfo",
+    "scr_keyiteminfo",
+    "scr_recruit_info",
+    "scr_quiztext",
+    "obj_shop",
+    "DEVICE_",
+    "obj_clubsenemy_old",
+    "UNUSED",
+)
+RE_HANGUL = re.compile(r"[\u1100-\u11ff\u3130-\u318f\uac00-\ud7a3]")
+
+CHAPTERS = ["1", "2", "3", "4"]
+
+# What the game draws, which isn't quite what render_markup() in
+# render_textdump.py prints: in the game every \X takes one argument character
+# except pictures (\O, \I), while render_markup() prints the argument of
+# message modifiers, so "\E8* 으음" is measured as "* 으음" here but rendered
+# as "8* 으음". Escaped backslashes and spaces are kept for split_lines().
+# Placeholders like ~1 are filled in with button or item names by the game,
+# but are measured as written.
+RE_MARKUP = re.compile(
+    r"(\\[\\ ])"
+    r"|\\[OI][ 　]*"
+    r"|\\[^OI\\ ].?"
+    r"|\^\d"
+    r"|[/%]+\s*$"
+)
+# Escaped characters, and line breaks
+RE_SPLIT = re.compile(r"\\([\\ ])|`(.)|([&#\n])")
+
+
+class Overflow(typing.NamedTuple):
+    chapter: str
+    key: str
+    line: str
+    width: int
+
+
+def parse_ttf_widths(data: bytes, size: int) -> array.array:
+    """Reads the advance width in pixels of every BMP character from a TTF.
+
+    Characters without a glyph get the width of .notdef (glyph 0).
+    """
+    (num_tables,) = struct.unpack_from(">H", data, 4)
+    tables = {}
+    for i in range(num_tables):
+        tag, _, offset, _ = struct.unpack_from(">4sIII", data, 12 + 16 * i)
+        tables[tag.decode()] = offset
+
+    (units_per_em,) = struct.unpack_from(">H", data, tables["head"] + 18)
+    (num_hmetrics,) = struct.unpack_from(">H", data, tables["hhea"] + 34)
+    advances = [
+        round(advance * size / units_per_em)
+        for advance, _ in struct.iter_unpack(
+            ">Hh", data[tables["hmtx"] : tables["hmtx"] + 4 * num_hmetrics]
+        )
+    ]
+
+    # Find the Windows Unicode BMP subtable (format 4).
+    cmap = tables["cmap"]
+    (num_subtables,) = struct.unpack_from(">H", data, cmap + 2)
+    for i in range(num_subtables):
+        platform, encoding, offset = struct.unpack_from(">HHI", data, cmap + 4 + 8 * i)
+        if (platform, encoding) in ((3, 1), (0, 3)):
+            subtable = cmap + offset
+            break
+    else:
+        raise ValueError("no Unicode BMP cmap subtable")
+    assert struct.unpack_from(">H", data, subtable)[0] == 4
+
+    (seg_count_x2,) = struct.unpack_from(">H", data, subtable + 6)
+    seg_count = seg_count_x2 // 2
+    ends_at = subtable + 14
+    starts_at = ends_at + seg_count_x2 + 2
+    deltas_at = starts_at + seg_count_x2
+    range_offsets_at = deltas_at + seg_count_x2
+    ends = struct.unpack_from(f">{seg_count}H", data, ends_at)
+    starts = struct.unpack_from(f">{seg_count}H", data, starts_at)
+    deltas = struct.unpack_from(f">{seg_count}h", data, deltas_at)
+    range_offsets = struct.unpack_from(f">{seg_count}H", data, range_offsets_at)
+
+    widths = array.array("B", [advances[0]]) * 0x10000
+    for seg, (start, end, delta, range_offset) in enumerate(
+        zip(starts, ends, deltas, range_offsets)
+    ):
+        for char in range(start, min(end, 0xFFFE) + 1):
+            if range_offset == 0:
+                glyph = (char + delta) & 0xFFFF
+            else:
+                glyph_at = range_offsets_at + 2 * seg + range_offset + 2 * (char - start)
+                (glyph,) = struct.unpack_from(">H", data, glyph_at)
+                if glyph:
+                    glyph = (glyph + delta) & 0xFFFF
+            # Glyphs past numberOfHMetrics share the last advance width.
+            widths[char] = advances[min(glyph, num_hmetrics - 1)]
+    return widths
+
+
+@functools.cache
+def load_widths(font: pathlib.Path, size: int = FONT_SIZE) -> array.array:
+    """Returns the width table for a font, extracting it only once."""
+    stat = font.stat()
+    cached = CACHE_DIR / f"{font.stem}.{size}.{stat.st_size}.{stat.st_mtime_ns}.widths"
+    if cached.exists():
+        widths = array.array("B")
+        widths.frombytes(cached.read_bytes())
+        return widths
+    widths = parse_ttf_widths(font.read_bytes(), size)
+    CACHE_DIR.mkdir(exist_ok=True)
+    cached.write_bytes(widths.tobytes())
+    return widths
+
+
+def split_lines(text: str, msgid: str) -> list[str]:
+    """Strips markup from a raw message and splits it into display lines.
+
+    Messages that print "&" or "#" as is are the ones render_textdump.py
+    knows about.
+    """
+    amp_literal = render_textdump.amp_is_literal(msgid)
+    hash_literal = msgid.startswith(render_textdump.HASH_LITERAL_PREFIXES)
+    hash_space = msgid.startswith(render_textdump.HASH_SPACE_PREFIX)
+
+    text = RE_MARKUP.sub(r"\1", text).replace("\t", " ")
+    lines = []
+    line = []
+    pos = 0
+    for m in RE_SPLIT.finditer(text):
+        line.append(text[pos : m.start()])
+        pos = m.end()
+        escaped, quoted, char = m.groups()
+        if char is None:
+            line.append(escaped or quoted)
+        elif char == "&" and amp_literal or char == "#" and hash_literal:
+            line.append(char)
+        elif char == "#" and hash_space:
+            line.append(" ")
+        else:
+            lines.append("".join(line))
+            line = []
+    line.append(text[pos:])
+    lines.append("".join(line))
+    return lines
+
+
+def line_widths(lines: list[str], widths: array.array) -> list[int]:
+    """Measures many lines at once.
+
+    The lines are joined and measured in one pass with running totals, so
+    the per-character work stays in C instead of a Python loop per line.
+    """
+    joined = "\n".join(lines)
+    # Everything the fonts cover is in the BMP, so UTF-16 code units are
+    # code points (surrogates simply measure as .notdef).
+    units = array.array("H", joined.encode("utf-16-le"))
+    if sys.byteorder == "big":
+        units.byteswap()
+    totals = array.array("L", [0])
+    totals.extend(itertools.accumulate(map(widths.__getitem__, units)))
+    out = []
+    pos = 0
+    for line in lines:
+        end = pos + len(line.encode("utf-16-le")) // 2
+        out.append(totals[end] - totals[pos])
+        pos = end + 1
+    return out
+
+
+def is_textbox_text(key: str, text: str, english: str | None) -> bool:
+    """Whether a message is translated text meant for the dialogue box."""
+    if key == "date" or not text or key.startswith(NOT_TEXTBOX_PREFIXES):
+        return False
+    # Untranslated messages are left as English (sometimes full-width), so
+    # they are as wide as the original.
+    return text != english and RE_HANGUL.search(text) is not None
+
+
+def find_overflows(
+    messages: dict[str, dict[str, str]],
+    english: dict[str, dict[str, str]],
+    widths: array.array,
+    max_width: int,
+) -> list[Overflow]:
+    keys = []
+    lines = []
+    for chapter, chapter_messages in messages.items():
+        chapter_english = english.get(chapter, {})
+        for key, text in chapter_messages.items():
+            if not is_textbox_text(key, text, chapter_english.get(key)):
+                continue
+            for line in split_lines(text, key):
+                keys.append((chapter, key))
+                lines.append(line)
+    return [
+        Overflow(chapter, key, line, width)
+        for (chapter, key), line, width in zip(keys, lines, line_widths(lines, widths))
+        if width > max_width
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--font",
+        type=pathlib.Path,
+        default=DEFAULT_FONT,
+        help=f"font to take widths from (default: {DEFAULT_FONT.name})",
+    )
+    parser.add_argument(
+        "--max-width",
+        type=int,
+        default=TEXTBOX_WIDTH,
+        help=f"widest allowed line in pixels (default: {TEXTBOX_WIDTH})",
+    )
+    parser.add_argument(
+        "chapters",
+        nargs="*",
+        default=CHAPTERS,
+        help="chapters to check (default: all)",
+    )
+    args = parser.parse_args()
+
+    widths = load_widths(args.font)
+    messages = {}
+    for chapter in args.chapters:
+        with open(f"{chapter}.json", encoding="utf-8") as f:
+            messages[chapter] = json.load(f)
+    try:
+        with open("lang.json", encoding="utf-8") as f:
+            english = {chapter: text["en"] for chapter, text in json.load(f).items()}
+    except FileNotFoundError:
+        english = {}
+
+    overflows = find_overflows(messages, english, widths, args.max_width)
+    for chapter, key, line, width in overflows:
+        print(f"{chapter}:{key}: {width}px > {args.max_width}px: {line!r}")
+    if overflows:
+        print(f"{len(overflows)} lines too wide.", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """Generate a lang.json for all chapters in both English and Japanese."""
 
+import argparse
 import io
 import json
 import pathlib
@@ -9,6 +10,8 @@ import subprocess
 import sys
 import typing
 
+import snippet_store
+
 # Expected directory structure:
 # ├── 1
 # │   ├── CodeEntries
@@ -22,11 +25,6 @@ import typing
 # ├── 3
 # └── 4
 # Originally extracted with UnderTale Mod Tool v0.8.1.1
-try:
-    source = pathlib.Path(sys.argv[1])
-except IndexError:
-    print(f"Usage: {sys.argv[0]} path/to/deltarune", file=sys.stderr)
-    sys.exit(1)
 
 
 type FunArgs = list[str | None]
@@ -117,6 +115,8 @@ class RgResult(typing.NamedTuple):
     filename: str
     lineno: int
     text: str
+    # Byte offset of the start of the line within the file
+    offset: int
 
 
 def rg(pattern: str, path: pathlib.Path) -> typing.Iterable[RgResult]:
@@ -158,121 +158,176 @@ def rg(pattern: str, path: pathlib.Path) -> typing.Iterable[RgResult]:
             filename=result["data"]["path"]["text"],
             lineno=result["data"]["line_number"],
             text=result["data"]["lines"]["text"],
+            offset=result["data"]["absolute_offset"],
         )
 
 
 CHAPTERS = [1, 2, 3, 4]
-text = {n: {} for n in CHAPTERS}
-sourcemap = {n: {} for n in CHAPTERS}
-
-for n in CHAPTERS:
-    path = source / str(n)
-    
-    # --- FIX 1 & 2: UTF-8 encoding and try/except for missing/corrupt files ---
-    
-    # Read lang_ja.json (all chapters)
-    ja_path = path / "lang" / "lang_ja.json"
-    try:
-        # Explicitly use UTF-8 to fix UnicodeDecodeError (cp949 issue)
-        ja: dict[str, str] = json.loads(ja_path.read_text(encoding="utf-8"))
-    except (FileNotFoundError, UnicodeDecodeError) as e:
-        print(f"Skipping Chapter {n}. Error reading required Japanese file {ja_path}: {e}", file=sys.stderr)
-        continue
-    
-    text[n]["ja"] = ja
-    
-    # Read lang_en.json (Chapter 1 only, for baseline)
-    if n == 1:
-        en_path = path / "lang" / "lang_en.json"
+type Text = dict[int, dict[str, dict[str, str | None]]]
+type Sourcemap = dict[int, dict[str, str]]
+type Offsets = dict[int, dict[str, int]]
+
+
+def extract(source: pathlib.Path) -> tuple[Text, Sourcemap, Offsets]:
+    """Extracts the text and sourcemap of every chapter under source.
+
+    Also returns the byte offset of every matched line, keyed like the
+    sourcemap values, for write_snippets().
+    """
+    text = {n: {} for n in CHAPTERS}
+    sourcemap = {n: {} for n in CHAPTERS}
+    offsets: Offsets = {n: {} for n in CHAPTERS}
+
+    for n in CHAPTERS:
+        path = source / str(n)
+
+        # --- FIX 1 & 2: UTF-8 encoding and try/except for missing/corrupt files ---
+
+        # Read lang_ja.json (all chapters)
+        ja_path = path / "lang" / "lang_ja.json"
         try:
-            # Explicitly use UTF-8 to fix UnicodeDecodeError
-            text[n]["en"] = json.loads(en_path.read_text(encoding="utf-8"))
+            # Explicitly use UTF-8 to fix UnicodeDecodeError (cp949 issue)
+            ja: dict[str, str] = json.loads(ja_path.read_text(encoding="utf-8"))
         except (FileNotFoundError, UnicodeDecodeError) as e:
-            print(f"Skipping Chapter 1. Error reading required English file {en_path}: {e}", file=sys.stderr)
+            print(f"Skipping Chapter {n}. Error reading required Japanese file {ja_path}: {e}", file=sys.stderr)
             continue
-            
-        # Chapter 1 logic: find all keys used
-        for filename, lineno, line in rg(
-            r"scr_84_get_lang_string\(",
+
+        text[n]["ja"] = ja
+
+        # Read lang_en.json (Chapter 1 only, for baseline)
+        if n == 1:
+            en_path = path / "lang" / "lang_en.json"
+            try:
+                # Explicitly use UTF-8 to fix UnicodeDecodeError
+                text[n]["en"] = json.loads(en_path.read_text(encoding="utf-8"))
+            except (FileNotFoundError, UnicodeDecodeError) as e:
+                print(f"Skipping Chapter 1. Error reading required English file {en_path}: {e}", file=sys.stderr)
+                continue
+
+            # Chapter 1 logic: find all keys used
+            for filename, lineno, line, offset in rg(
+                r"scr_84_get_lang_string\(",
+                path / "CodeEntries",
+            ):
+                offsets[n][f"{filename}:{lineno}"] = offset
+                for func, args in parse_line(line):
+                    match func, args:
+                        case "scr_84_get_lang_string", [str(arg)]:
+                            # setdefault() so that the first one wins. Why?
+                            # 1. Predictable ordering: if we overrid then keys would
+                            #    be ordered by first match but contain last match.
+                            # 2. Better results for obj_ch2_scene26_powers_combined.
+                            sourcemap[n].setdefault(arg, f"{filename}:{lineno}")
+                        case _:
+                            print(func, args, line, file=sys.stderr)
+                            sys.exit(1)
+            continue
+
+        # Chapters 2, 3, 4 logic: extract strings
+        en: dict[str, str] = {}
+        text[n]["en"] = en
+
+        for filename, lineno, line, offset in rg(
+            f"({'|'.join(TEXTFUNCS)})\\([^)]",
             path / "CodeEntries",
         ):
+            offsets[n][f"{filename}:{lineno}"] = offset
             for func, args in parse_line(line):
                 match func, args:
+                    case "scr_84_get_lang_string", [None]:
+                        pass
                     case "scr_84_get_lang_string", [str(arg)]:
-                        # setdefault() so that the first one wins. Why?
-                        # 1. Predictable ordering: if we overrid then keys would
-                        #    be ordered by first match but contain last match.
-                        # 2. Better results for obj_ch2_scene26_powers_combined.
-                        sourcemap[n].setdefault(arg, f"{filename}:{lineno}")
+                        # Copy string from Chapter 1 English data
+                        if arg in text[1]["en"]:
+                            en[arg] = text[1]["en"][arg]
+                            sourcemap[n].setdefault(arg, f"{filename}:{lineno}")
+                        else:
+                            print(f"Warning: Chapter {n} references key '{arg}' not found in Chapter 1 English data.", file=sys.stderr)
+                    case "msgsetloc", [None, r"\C2"]:
+                        pass
+                    case "msgsetsubloc", [None, r"\TX \F0 \E~1 \Fb \T0 %", None]:
+                        pass
+                    case (
+                        ("stringsetloc", [str(trans), str(key)])
+                        | ("msgsetsubloc", [_, str(trans), *_, str(key)])
+                        | ("msgnextsubloc", [str(trans), *_, str(key)])
+                        | ("stringsetsubloc", [str(trans), *_, str(key)])
+                        | ("msgsetloc", [_, str(trans), str(key)])
+                        | ("msgnextloc", [str(trans), str(key)])
+                    ):
+                        assert " " not in key, repr(key)
+                        # Sometimes the same key has multiple English versions.
+                        # (Mostly (exclusively?) for debug stuff.)
+                        while key in en and en[key] != trans:
+                            key += "_DUP"
+                        en[key] = trans
+                        sourcemap[n].setdefault(key, f"{filename}:{lineno}")
                     case _:
                         print(func, args, line, file=sys.stderr)
                         sys.exit(1)
-        continue
-        
-    # Chapters 2, 3, 4 logic: extract strings
-    en: dict[str, str] = {}
-    text[n]["en"] = en
-
-    for filename, lineno, line in rg(
-        f"({'|'.join(TEXTFUNCS)})\\([^)]",
-        path / "CodeEntries",
-    ):
-        for func, args in parse_line(line):
-            match func, args:
-                case "scr_84_get_lang_string", [None]:
-                    pass
-                case "scr_84_get_lang_string", [str(arg)]:
-                    # Copy string from Chapter 1 English data
-                    if arg in text[1]["en"]:
-                        en[arg] = text[1]["en"][arg]
-                        sourcemap[n].setdefault(arg, f"{filename}:{lineno}")
-                    else:
-                        print(f"Warning: Chapter {n} references key '{arg}' not found in Chapter 1 English data.", file=sys.stderr)
-                case "msgsetloc", [None, r"\C2"]:
-                    pass
-                case "msgsetsubloc", [None, r"\TX \F0 \E~1 \Fb \T0 %", None]:
-                    pass
-                case (
-                    ("stringsetloc", [str(trans), str(key)])
-                    | ("msgsetsubloc", [_, str(trans), *_, str(key)])
-                    | ("msgnextsubloc", [str(trans), *_, str(key)])
-                    | ("stringsetsubloc", [str(trans), *_, str(key)])
-                    | ("msgsetloc", [_, str(trans), str(key)])
-                    | ("msgnextloc", [str(trans), str(key)])
-                ):
-                    assert " " not in key, repr(key)
-                    # Sometimes the same key has multiple English versions.
-                    # (Mostly (exclusively?) for debug stuff.)
-                    while key in en and en[key] != trans:
-                        key += "_DUP"
-                    en[key] = trans
-                    sourcemap[n].setdefault(key, f"{filename}:{lineno}")
-                case _:
-                    print(func, args, line, file=sys.stderr)
-                    sys.exit(1)
-
-# Scrambled fragments. Only the Japanese translation uses a translation key.
-# The Japanese translation actually has one fragment more, that's probably
-# why these aren't translated normally.
-if 4 in text: # Only apply if Chapter 4 was successfully processed
-    text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_90_0"] = "where "
-    text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_91_0"] = "the "
-    text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_92_0"] = "tail. "
-    text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_93_0"] = "pointed "
-    text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_94_0"] = "the "
-    text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_95_0"] = "children "
-    text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_96_0"] = "would "
-    text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_97_0"] = "grow,"
-    text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_98_0"] = "the "
-    text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_99_0"] = "Lost "
-    text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_100_0"] = "forest "
-    text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_101_0"] = "followed "
-    # Note: The original code sets this to None, which might cause JSON serialization issues.
-    # Leaving as None for fidelity to original logic, assuming the JSON serializer handles it or it's implicitly skipped.
-    text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_102_0"] = None 
-
-# Final file writing already uses UTF-8 and is correct.
-with open("lang.json", "w", encoding="utf-8") as f:
-    json.dump(text, f, indent=0, ensure_ascii=False, sort_keys=True)
-with open("sourcemap.json", "w", encoding="utf-8") as f:
-    json.dump(sourcemap, f, indent=0, ensure_ascii=False, sort_keys=True)
+
+    # Scrambled fragments. Only the Japanese translation uses a translation key.
+    # The Japanese translation actually has one fragment more, that's probably
+    # why these aren't translated normally.
+    if 4 in text: # Only apply if Chapter 4 was successfully processed
+        text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_90_0"] = "where "
+        text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_91_0"] = "the "
+        text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_92_0"] = "tail. "
+        text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_93_0"] = "pointed "
+        text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_94_0"] = "the "
+        text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_95_0"] = "children "
+        text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_96_0"] = "would "
+        text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_97_0"] = "grow,"
+        text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_98_0"] = "the "
+        text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_99_0"] = "Lost "
+        text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_100_0"] = "forest "
+        text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_101_0"] = "followed "
+        # Note: The original code sets this to None, which might cause JSON serialization issues.
+        # Leaving as None for fidelity to original logic, assuming the JSON serializer handles it or it's implicitly skipped.
+        text[4]["en"]["obj_dw_churchb_bookshelf_slash_Step_0_gml_102_0"] = None 
+
+    return text, sourcemap, offsets
+
+
+def write_lang(text: Text, sourcemap: Sourcemap) -> None:
+    # Final file writing already uses UTF-8 and is correct.
+    with open("lang.json", "w", encoding="utf-8") as f:
+        json.dump(text, f, indent=0, ensure_ascii=False, sort_keys=True)
+    with open("sourcemap.json", "w", encoding="utf-8") as f:
+        json.dump(sourcemap, f, indent=0, ensure_ascii=False, sort_keys=True)
+
+
+def write_snippets(
+    source: pathlib.Path, sourcemap: Sourcemap, offsets: Offsets, context: int
+) -> None:
+    locations = {}
+    for n in CHAPTERS:
+        locations[n] = {}
+        for key, location in sourcemap[n].items():
+            filename, lineno = location.rsplit(":", 1)
+            locations[n][key] = (filename, int(lineno), offsets[n][location])
+    snippet_store.write_store(
+        locations, lambda n: source / str(n) / "CodeEntries", context
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("source", type=pathlib.Path, metavar="path/to/deltarune")
+    parser.add_argument(
+        "--snippets",
+        type=int,
+        metavar="N",
+        help="also write snippets.bin/snippets.json with N lines of code around each text call",
+    )
+    options = parser.parse_args()
+    source: pathlib.Path = options.source
+
+    text, sourcemap, offsets = extract(source)
+    write_lang(text, sourcemap)
+    if options.snippets is not None:
+        write_snippets(source, sourcemap, offsets, options.snippets)
+
+
+if __name__ == "__main__":
+    main()
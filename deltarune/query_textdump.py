@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""Look up rendered messages by key, group, chapter or source file.
+
+Reads rendered.json and sourcemap.json from the current directory, so other
+tools don't have to load (and index) the whole dump themselves.
+
+    query_textdump.py serve [[HOST:]PORT]
+    query_textdump.py key MSGID [CHAPTER]
+    query_textdump.py group GROUP [CHAPTER]
+    query_textdump.py file FILENAME [CHAPTER]
+    query_textdump.py chapter CHAPTER
+    query_textdump.py snippet MSGID [CHAPTER]
+
+The server answers the same queries over HTTP, e.g. GET /key/MSGID?chap=2,
+and only listens on localhost unless told otherwise. Snippet lookups need
+the snippets.bin/snippets.json store from extract_textdump.py --snippets.
+"""
+
+import asyncio
+import functools
+import json
+import sys
+import typing
+import urllib.parse
+
+import snippet_store
+
+KINDS = ("key", "group", "file", "chapter", "snippet")
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+# Plenty for the hot keys of a bot or a spreadsheet sync, and every cached
+# response is a single bytes object so this stays at a few MB at most.
+CACHE_SIZE = 1024
+
+
+class Entry(typing.NamedTuple):
+    """Where a single message lives."""
+
+    chapter: str
+    group: str
+    key: str
+    source: str | None
+
+
+class NotFound(Exception):
+    pass
+
+
+class Index:
+    """Indexes over rendered.json, keyed the same way as the page."""
+
+    def __init__(
+        self,
+        rendered: dict[str, dict[str, dict[str, dict[str, str | None]]]],
+        sourcemap: dict[str, dict[str, str]],
+        snippets: snippet_store.SnippetStore | None = None,
+        cache_size: int = CACHE_SIZE,
+    ) -> None:
+        self.rendered = rendered
+        self.snippets = snippets
+        self.by_key: dict[str, list[Entry]] = {}
+        self.by_group: dict[str, list[Entry]] = {}
+        self.by_file: dict[str, list[Entry]] = {}
+        self.chapters: dict[str, dict[str, int]] = {}
+
+        for chap, groups in rendered.items():
+            self.chapters[chap] = {}
+            for group, messages in groups.items():
+                self.chapters[chap][group] = len(messages)
+                for key in messages:
+                    source = sourcemap.get(chap, {}).get(key)
+                    entry = Entry(chap, group, key, source)
+                    self.by_key.setdefault(key, []).append(entry)
+                    self.by_group.setdefault(group, []).append(entry)
+                    if source:
+                        filename = source.rsplit(":", 1)[0]
+                        self.by_file.setdefault(filename, []).append(entry)
+
+        self.query = functools.lru_cache(maxsize=cache_size)(self._query)
+
+    def _query(self, kind: str, value: str, chapter: str | None = None) -> bytes:
+        """Runs a query and returns the JSON response body.
+
+        Raises NotFound if nothing matches, so that misses aren't cached.
+        """
+        if kind == "chapter":
+            if value not in self.chapters:
+                raise NotFound(f"no chapter {value!r}")
+            result: typing.Any = self.chapters[value]
+        elif kind == "snippet":
+            result = []
+            for entry in self.by_key.get(value, ()):
+                if chapter is not None and entry.chapter != chapter:
+                    continue
+                snippet = self.snippets and self.snippets.get(entry.chapter, entry.key)
+                if snippet:
+                    result.append({**entry._asdict(), **snippet._asdict()})
+            if not result:
+                raise NotFound(f"no snippet for {value!r}")
+        else:
+            index = {
+                "key": self.by_key,
+                "group": self.by_group,
+                "file": self.by_file,
+            }[kind]
+            entries = [
+                entry
+                for entry in index.get(value, ())
+                if chapter is None or entry.chapter == chapter
+            ]
+            if not entries:
+                raise NotFound(f"no {kind} {value!r}")
+            result = [
+                {
+                    **entry._asdict(),
+                    **self.rendered[entry.chapter][entry.group][entry.key],
+                }
+                for entry in entries
+            ]
+        return json.dumps(result, ensure_ascii=False).encode()
+
+
+def load_index(cache_size: int = CACHE_SIZE) -> Index:
+    with open("rendered.json", encoding="utf-8") as f:
+        rendered = json.load(f)
+    try:
+        with open("sourcemap.json", encoding="utf-8") as f:
+            sourcemap = json.load(f)
+    except FileNotFoundError:
+        print("Warning: sourcemap.json not found, file lookups disabled.", file=sys.stderr)
+        sourcemap = {}
+    try:
+        snippets = snippet_store.SnippetStore()
+    except FileNotFoundError:
+        snippets = None
+    return Index(rendered, sourcemap, snippets, cache_size)
+
+
+STATUS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+}
+
+
+def respond(target: str, index: Index) -> tuple[int, bytes]:
+    """Maps a request target like /key/MSGID?chap=1 to a status and body."""
+    url = urllib.parse.urlsplit(target)
+    parts = url.path.strip("/").split("/", 1)
+    if len(parts) != 2 or parts[0] not in KINDS or not parts[1]:
+        return 400, error(f"expected /{{{'|'.join(KINDS)}}}/VALUE")
+    kind, value = parts[0], urllib.parse.unquote(parts[1])
+    chapter = urllib.parse.parse_qs(url.query).get("chap", [None])[0]
+    try:
+        return 200, index.query(kind, value, chapter)
+    except NotFound as e:
+        return 404, error(str(e))
+
+
+def error(message: str) -> bytes:
+    return json.dumps({"error": message}, ensure_ascii=False).encode()
+
+
+async def handle(
+    index: Index, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    try:
+        request_line = await reader.readline()
+        # Drain the headers, we don't need any of them.
+        while (await reader.readline()).strip():
+            pass
+        try:
+            method, target, _ = request_line.decode("latin-1").split()
+        except ValueError:
+            status, body = 400, error("malformed request line")
+        else:
+            if method not in ("GET", "HEAD"):
+                status, body = 405, error(f"method {method} not allowed")
+            else:
+                status, body = respond(target, index)
+        length = len(body)
+        if request_line.startswith(b"HEAD "):
+            # Same headers as GET, just without the body.
+            body = b""
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS[status]}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {length}\r\n"
+            "Access-Control-Allow-Origin: *\r\n"
+            "Connection: close\r\n"
+            "\r\n".encode()
+            + body
+        )
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(index: Index, host: str, port: int) -> None:
+    server = await asyncio.start_server(
+        functools.partial(handle, index), host, port
+    )
+    for sock in server.sockets:
+        print(f"Serving on http://{sock.getsockname()[0]}:{sock.getsockname()[1]}/", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+def usage() -> typing.NoReturn:
+    print("Usage:", __doc__.split("\n\n")[2], sep="\n", file=sys.stderr)
+    sys.exit(1)
+
+
+def main(argv: list[str]) -> None:
+    match argv:
+        case ["serve"]:
+            host, port = DEFAULT_HOST, DEFAULT_PORT
+        case ["serve", address]:
+            host, _, port_str = address.rpartition(":")
+            host = host or DEFAULT_HOST
+            try:
+                port = int(port_str)
+            except ValueError:
+                usage()
+            if not 0 <= port <= 65535:
+                usage()
+        case ["chapter", value]:
+            chapter = None
+        case [("key" | "group" | "file" | "snippet"), value]:
+            chapter = None
+        case [("key" | "group" | "file" | "snippet"), value, chapter]:
+            pass
+        case _:
+            usage()
+
+    index = load_index()
+    if argv[0] == "serve":
+        try:
+            asyncio.run(serve(index, host, port))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    try:
+        print(index.query(argv[0], value, chapter).decode())
+    except NotFound as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
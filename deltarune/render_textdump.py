@@ -1,19 +1,164 @@
 #!/usr/bin/env python3
 """Convert lang.json to the data we want to show on the page."""
 
+import argparse
+import base64
 import html
 import io
 import json
+import os
 import re
+import sqlite3
 import sys
 import typing
 
 
-def render(text: str | None, msgid: str, lang: str) -> str | None:
+# Messages where "&" is shown as is instead of starting a new line
+AMP_LITERAL_PREFIXES = (
+    "scr_credit",
+    "obj_credits",
+    "scr_monstersetup",
+    "scr_monstersetup_slash_scr_monstersetup_gml_1612_0",
+    "scr_monstersetup_slash_scr_monstersetup_gml_1614_0",
+    "obj_mike_minigame_tv",
+    "obj_fusionmenu",
+    "obj_b1rocks1",
+    "scr_quiztext",
+    "obj_b3bs_lancerget_lancer",
+    "obj_shop2_slash_Create",
+)
+AMP_LITERAL_EXCEPTIONS = [
+    "scr_monstersetup_slash_scr_monstersetup_gml_27_0",
+    "obj_fusionmenu_slash_Draw_0_gml_182_0",
+]
+# Messages where "/" is shown as is instead of ending the message
+SLASH_LITERAL_PREFIXES = (
+    "obj_controller_city_mice2_slash_Draw_0_gml_28_0",
+    "obj_fusionmenu_slash_Draw_0_gml_181_0",
+    "obj_overworldc_slash_Draw_0_gml_37_0",
+    "obj_overworldc_slash_Draw_0_gml_69_0",
+    "scr_armorinfo_slash_scr_armorinfo_gml_433_0_b",
+    "scr_armorinfo_slash_scr_armorinfo_gml_553_0",
+    "scr_armorinfo_slash_scr_armorinfo_gml_791_0",
+    "scr_armorinfo_slash_scr_armorinfo_gml_791_0",
+    "scr_spellinfo_slash_scr_spellinfo_gml_109_0",
+    "obj_overworldc_slash_Draw_0_gml_68_0",
+    "obj_credits_2_slash_Step_0_gml_177_0",
+    "obj_npc_room_slash_Other_10_gml_982_0",
+    "obj_b1power_slash_Step_0_gml_154_0",
+    "scr_armorinfo_slash_scr_armorinfo_gml_539_0",
+    "scr_credit_slash_scr_credit_gml_64_0_b",
+    "scr_credit_slash_scr_credit_gml_78_0",
+    "scr_credit_slash_scr_credit_gml_95_0",
+    "scr_text_slash_scr_text_gml_11097_0",
+)
+# Same for "%"
+PERCENT_LITERAL_PREFIXES = (
+    "scr_weaponinfo",
+    "scr_armorinfo",
+    "scr_iteminfo",
+    "scr_itemdesc",
+    "scr_monstersetup",
+)
+PERCENT_LITERAL_MSGIDS = [
+    "scr_text_slash_scr_text_gml_1886_0",
+    "scr_text_slash_scr_text_gml_8925_0",
+    "scr_text_slash_scr_text_gml_8926_0",
+    "obj_battlecontroller_slash_Draw_0_gml_171_0",
+    "obj_battlecontroller_slash_Draw_0_gml_280_0",
+    "obj_fusionmenu_slash_Step_0_gml_144_0",
+    "obj_shop_ch2_spamton_slash_Create_0_gml_89_0",
+    "obj_npc_room_slash_Other_10_gml_982_0",
+]
+# Same for "#"
+HASH_LITERAL_PREFIXES = (
+    "obj_readable_room1",
+    "obj_npc_room_animated_slash_Other_10_gml_41_0",
+    "obj_npc_room_animated_slash_Other_10_gml_57_0",
+)
+HASH_SPACE_PREFIX = "obj_bloxer_enemy_slash_Step_0_gml_135_1"
+N_TILDE_MSGID = "obj_dw_church_intro_guei_slash_Step_0_gml_169_0"
+
+
+def amp_is_literal(msgid: str) -> bool:
+    """Whether "&" in this message is printed rather than a line break."""
+    return (
+        msgid.startswith(AMP_LITERAL_PREFIXES)
+        and msgid not in AMP_LITERAL_EXCEPTIONS
+        and not msgid.startswith(("obj_credits_ch4",))
+    )
+
+
+# Most messages are just text, line breaks, pauses and message modifiers
+# (faces, sounds...) followed by an end marker. Those don't need the loop in
+# render_markup(), which is where nearly all the time goes. Anything else, or
+# anything from a message with its own rules, still takes the long way.
+# (^ followed by non-ASCII is excluded because str.isdigit() accepts more
+# than [0-9].)
+RULE_MSGID_PREFIXES = (
+    *SLASH_LITERAL_PREFIXES,
+    *PERCENT_LITERAL_PREFIXES,
+    *PERCENT_LITERAL_MSGIDS,
+    *AMP_LITERAL_PREFIXES,
+    *HASH_LITERAL_PREFIXES,
+    HASH_SPACE_PREFIX,
+    N_TILDE_MSGID,
+)
+RE_PLAIN_END = re.compile(r"[/%]")
+# Endings render_markup() stops at without complaint
+RE_PLAIN_TERMINATOR = re.compile(r"/[%/~1\s]*|%(?:%|%%|/%)?")
+RE_NOT_PLAIN = re.compile(r"[`~<>]|\\(?![METFSsafCUm])|\^[^\x00-\x7f]")
+RE_PLAIN_SKIP = re.compile(r"\\[METFSsafCUm]|\^[0-9]?")
+PLAIN_TRANSLATION = str.maketrans({"&": "\n", "#": "\n", "\t": " "})
+
+
+def plain_body(text: str, msgid: str) -> str | None:
+    """Returns the part of a message to render if it can skip render_markup().
+
+    That's everything before the end marker, or None if the message needs
+    the full loop.
+    """
+    if msgid.startswith(RULE_MSGID_PREFIXES):
+        return None
+    end = RE_PLAIN_END.search(text)
+    if end:
+        if not RE_PLAIN_TERMINATOR.fullmatch(text, end.start()):
+            return None
+        text = text[: end.start()]
+    if RE_NOT_PLAIN.search(text):
+        return None
+    return text
+
+
+def render(
+    text: str | None, msgid: str, lang: str, fast_path: bool = True
+) -> str | None:
     if not text:
         return None
     if text in ("/*", "/＊") and "shop" in msgid:
         return ""
+    body = plain_body(text, msgid) if fast_path else None
+    if body is not None:
+        rendered = RE_PLAIN_SKIP.sub("", body).translate(PLAIN_TRANSLATION)
+    else:
+        rendered = render_markup(text, msgid, lang)
+    if (
+        lang == "en"
+        and rendered.startswith("* ")
+        and "\n" in rendered
+        and r"\C" not in text
+    ):
+        rendered = re.sub(r"\n *([^*])", "\n  \\1", rendered)
+    if lang == "en" and rendered.startswith("* "):
+        rendered = (
+            '<div class="indented">'
+            + rendered.replace("\n", '</div><div class="indented">')
+            + "</div>"
+        )
+    return rendered
+
+
+def render_markup(text: str, msgid: str, lang: str) -> str:
     out = io.StringIO()
     color = "W"
     i = 0
@@ -106,28 +251,7 @@ def render(text: str | None, msgid: str, lang: str) -> str | None:
             case "/" if msgid == "obj_dw_churchb_rotatingtower_slash_Create_0_gml_90_0":
                 break
 
-            case "/" if not msgid.startswith(
-                (
-                    "obj_controller_city_mice2_slash_Draw_0_gml_28_0",
-                    "obj_fusionmenu_slash_Draw_0_gml_181_0",
-                    "obj_overworldc_slash_Draw_0_gml_37_0",
-                    "obj_overworldc_slash_Draw_0_gml_69_0",
-                    "scr_armorinfo_slash_scr_armorinfo_gml_433_0_b",
-                    "scr_armorinfo_slash_scr_armorinfo_gml_553_0",
-                    "scr_armorinfo_slash_scr_armorinfo_gml_791_0",
-                    "scr_armorinfo_slash_scr_armorinfo_gml_791_0",
-                    "scr_spellinfo_slash_scr_spellinfo_gml_109_0",
-                    "obj_overworldc_slash_Draw_0_gml_68_0",
-                    "obj_credits_2_slash_Step_0_gml_177_0",
-                    "obj_npc_room_slash_Other_10_gml_982_0",
-                    "obj_b1power_slash_Step_0_gml_154_0",
-                    "scr_armorinfo_slash_scr_armorinfo_gml_539_0",
-                    "scr_credit_slash_scr_credit_gml_64_0_b",
-                    "scr_credit_slash_scr_credit_gml_78_0",
-                    "scr_credit_slash_scr_credit_gml_95_0",
-                    "scr_text_slash_scr_text_gml_11097_0",
-                )
-            ):
+            case "/" if not msgid.startswith(SLASH_LITERAL_PREFIXES):
                 rest = text[i + 1 :]
                 # 허용되는 꼴만 통과시키되, 그렇지 않으면 경고만 찍고 루프 종료
                 if re.match(r'^[%/~1\s]*$', rest):
@@ -137,41 +261,13 @@ def render(text: str | None, msgid: str, lang: str) -> str | None:
                     # 원래는 assert로 죽였는데, 이제는 가능한 안전하게 남은 문자열을 무시하고 종료
                     break
 
-            case "&" if (
-                msgid.startswith(
-                    (
-                        "scr_credit",
-                        "obj_credits",
-                        "scr_monstersetup",
-                        "scr_monstersetup_slash_scr_monstersetup_gml_1612_0",
-                        "scr_monstersetup_slash_scr_monstersetup_gml_1614_0",
-                        "obj_mike_minigame_tv",
-                        "obj_fusionmenu",
-                        "obj_b1rocks1",
-                        "scr_quiztext",
-                        "obj_b3bs_lancerget_lancer",
-                        "obj_shop2_slash_Create",
-                    )
-                )
-                and msgid
-                not in [
-                    "scr_monstersetup_slash_scr_monstersetup_gml_27_0",
-                    "obj_fusionmenu_slash_Draw_0_gml_182_0",
-                ]
-                and not msgid.startswith(("obj_credits_ch4",))
-            ):
+            case "&" if amp_is_literal(msgid):
                 out.write("&amp;")
 
-            case "#" if msgid.startswith(
-                (
-                    "obj_readable_room1",
-                    "obj_npc_room_animated_slash_Other_10_gml_41_0",
-                    "obj_npc_room_animated_slash_Other_10_gml_57_0",
-                )
-            ):
+            case "#" if msgid.startswith(HASH_LITERAL_PREFIXES):
                 out.write("#")
 
-            case "#" if msgid.startswith("obj_bloxer_enemy_slash_Step_0_gml_135_1"):
+            case "#" if msgid.startswith(HASH_SPACE_PREFIX):
                 out.write(" ")
 
             case "&" | "#":
@@ -185,27 +281,9 @@ def render(text: str | None, msgid: str, lang: str) -> str | None:
                     i += 1
 
             case "%" if (
-                msgid.startswith(
-                    (
-                        "scr_weaponinfo",
-                        "scr_armorinfo",
-                        "scr_iteminfo",
-                        "scr_itemdesc",
-                        "scr_monstersetup",
-                    )
-                )
+                msgid.startswith(PERCENT_LITERAL_PREFIXES)
                 and not msgid.startswith(("scr_itemdesc_oldtype",))
-                or msgid
-                in [
-                    "scr_text_slash_scr_text_gml_1886_0",
-                    "scr_text_slash_scr_text_gml_8925_0",
-                    "scr_text_slash_scr_text_gml_8926_0",
-                    "obj_battlecontroller_slash_Draw_0_gml_171_0",
-                    "obj_battlecontroller_slash_Draw_0_gml_280_0",
-                    "obj_fusionmenu_slash_Step_0_gml_144_0",
-                    "obj_shop_ch2_spamton_slash_Create_0_gml_89_0",
-                    "obj_npc_room_slash_Other_10_gml_982_0",
-                ]
+                or msgid in PERCENT_LITERAL_MSGIDS
             ):
                 out.write("%")
 
@@ -236,7 +314,7 @@ def render(text: str | None, msgid: str, lang: str) -> str | None:
                 out.write(f'<span class="param">~{text[i + 1]}</span>')
                 i += 1
 
-            case "N" if msgid == "obj_dw_church_intro_guei_slash_Step_0_gml_169_0":
+            case "N" if msgid == N_TILDE_MSGID:
                 out.write("Ñ")
 
             case char:
@@ -245,21 +323,7 @@ def render(text: str | None, msgid: str, lang: str) -> str | None:
 
     if color != "W":
         out.write("</span>")
-    rendered = out.getvalue()
-    if (
-        lang == "en"
-        and rendered.startswith("* ")
-        and "\n" in rendered
-        and r"\C" not in text
-    ):
-        rendered = re.sub(r"\n *([^*])", "\n  \\1", rendered)
-    if lang == "en" and rendered.startswith("* "):
-        rendered = (
-            '<div class="indented">'
-            + rendered.replace("\n", '</div><div class="indented">')
-            + "</div>"
-        )
-    return rendered
+    return out.getvalue()
 
 
 
@@ -394,88 +458,73 @@ def smartsort(key: str):
 # Literal 타입에 'ko' 추가
 lang_str_type = typing.Literal["en", "ja", "ko"]
 
-lang: dict[str, dict[lang_str_type, dict[str, str]]] = json.load(
-    open("lang.json", encoding="utf-8")
-)
-
-# Load Korean data and merge it
-ko_chapters = ["1", "2", "3", "4"]
-for chap in ko_chapters:
-    ko_filename = f"{chap}.json"
-    try:
-        with open(ko_filename, encoding="utf-8") as f:
-            ko_data = json.load(f)
-        
-        if chap not in lang:
-            # If chapter isn't in lang.json, create a stub for it
-            print(f"Note: Chapter {chap} not found in lang.json, creating new entry for Korean.", file=sys.stderr)
-            lang[chap] = {"en": {}, "ja": {}}
-        
-        # Add the loaded Korean data under the 'ko' key
-        lang[chap]["ko"] = ko_data
-    
-    except FileNotFoundError:
-        print(f"Warning: {ko_filename} not found, skipping Korean data for chapter {chap}.", file=sys.stderr)
-        if chap in lang and "ko" not in lang[chap]:
-            lang[chap]["ko"] = {} # Add empty dict to prevent errors later
-    except json.JSONDecodeError as e:
-        print(f"Warning: Error decoding {ko_filename} (Error: {e}), skipping Korean data for chapter {chap}.", file=sys.stderr)
-        if chap in lang and "ko" not in lang[chap]:
-            lang[chap]["ko"] = {} # Add empty dict
+Lang = dict[str, dict[lang_str_type, dict[str, str]]]
+Rendered = dict[str, dict[str, dict[str, dict[lang_str_type, str | None]]]]
+
+
+def add_korean(lang: Lang) -> None:
+    """Load Korean data and merge it"""
+    ko_chapters = ["1", "2", "3", "4"]
+    for chap in ko_chapters:
+        ko_filename = f"{chap}.json"
+        try:
+            with open(ko_filename, encoding="utf-8") as f:
+                ko_data = json.load(f)
+
+            if chap not in lang:
+                # If chapter isn't in lang.json, create a stub for it
+                print(f"Note: Chapter {chap} not found in lang.json, creating new entry for Korean.", file=sys.stderr)
+                lang[chap] = {"en": {}, "ja": {}}
+
+            # Add the loaded Korean data under the 'ko' key
+            lang[chap]["ko"] = ko_data
+
+        except FileNotFoundError:
+            print(f"Warning: {ko_filename} not found, skipping Korean data for chapter {chap}.", file=sys.stderr)
+            if chap in lang and "ko" not in lang[chap]:
+                lang[chap]["ko"] = {} # Add empty dict to prevent errors later
+        except json.JSONDecodeError as e:
+            print(f"Warning: Error decoding {ko_filename} (Error: {e}), skipping Korean data for chapter {chap}.", file=sys.stderr)
+            if chap in lang and "ko" not in lang[chap]:
+                lang[chap]["ko"] = {} # Add empty dict
 # --- [!수정된 부분 끝!] ---
 
 
-sourcemap = json.load(
-    open("sourcemap.json", encoding="utf-8")
-)
-rendered: dict[
-    str, dict[str, dict[str, dict[lang_str_type, str | None]]]
-] = {}
-
-# 'n'을 루프 밖에서 전역 변수로 설정
-for n_loop in lang:
-    n = n_loop # smartsort에서 사용할 전역 변 n 설정
-    rendered[n] = {}
-    
-    # Ensure 'ko' key exists, even if empty, to prevent KeyErrors
-    if "ko" not in lang[n]:
-        lang[n]["ko"] = {}
-        
-    ks = sorted(lang[n]["en"].keys() | lang[n]["ja"].keys() | lang[n]["ko"].keys(), key=smartsort)
-    for k in ks:
-        if k == "date":
-            continue
-        en = lang[n]["en"].get(k)
-        ja = lang[n]["ja"].get(k)
-        ko = lang[n]["ko"].get(k)
-        group = groupify(k)
-        if (en and en.strip(" \\C234")) or (ja and ja.strip(" \\C234")) or (ko and ko.strip(" \\C234")):
-            ren = render(en, k, "en")
-            rja = render(ja, k, "ja")
-            rko = render(ko, k, "ko")
-            if k.startswith("scr_rhythmgame_notechart_"):
-                # TODO: stretch Japanese text (different syntax, can't assume font width...)
-                if ren: # ren이 None이 아닐 때만 실행
-                    ren = your_____long(ren, k)
-            if (ren and ren.strip()) or (rja and rja.strip()) or (rko and rko.strip()):
-                rendered[n].setdefault(group, {})
-                rendered[n][group][k] = {"en": ren, "ja": rja, "ko": rko}
-
-# Mainly for reference in the git diff.
-# Easier for other programs to ingest than the JS file below.
-with open("rendered.json", "w", encoding="utf-8") as f:
-    json.dump(rendered, f, indent=0, ensure_ascii=False)
-
-# https://v8.dev/blog/cost-of-javascript-2019#json
-# TL;DR: JSON parsed from a string literal is faster than an object literal.
-# This saves ~60ms in the node.js CLI on my laptop.
-with open("rendered.json.js", "w", encoding="utf-8") as f:
-    as_json = json.dumps(
-        rendered, indent=None, ensure_ascii=False, separators=(",", ":")
-    )
-    f.write("var rendered = JSON.parse('")
-    f.write(as_json.replace("\\", "\\\\").replace("'", "\\'"))
-    f.write("');")
+def render_all(lang: Lang, chapter_sourcemap: dict[str, dict[str, str]]) -> Rendered:
+    global n, sourcemap # smartsort에서 사용
+    sourcemap = chapter_sourcemap
+    rendered: Rendered = {}
+
+    # 'n'을 루프 밖에서 전역 변수로 설정
+    for n_loop in lang:
+        n = n_loop # smartsort에서 사용할 전역 변 n 설정
+        rendered[n] = {}
+
+        # Ensure 'ko' key exists, even if empty, to prevent KeyErrors
+        if "ko" not in lang[n]:
+            lang[n]["ko"] = {}
+
+        ks = sorted(lang[n]["en"].keys() | lang[n]["ja"].keys() | lang[n]["ko"].keys(), key=smartsort)
+        for k in ks:
+            if k == "date":
+                continue
+            en = lang[n]["en"].get(k)
+            ja = lang[n]["ja"].get(k)
+            ko = lang[n]["ko"].get(k)
+            group = groupify(k)
+            if (en and en.strip(" \\C234")) or (ja and ja.strip(" \\C234")) or (ko and ko.strip(" \\C234")):
+                ren = render(en, k, "en")
+                rja = render(ja, k, "ja")
+                rko = render(ko, k, "ko")
+                if k.startswith("scr_rhythmgame_notechart_"):
+                    # TODO: stretch Japanese text (different syntax, can't assume font width...)
+                    if ren: # ren이 None이 아닐 때만 실행
+                        ren = your_____long(ren, k)
+                if (ren and ren.strip()) or (rja and rja.strip()) or (rko and rko.strip()):
+                    rendered[n].setdefault(group, {})
+                    rendered[n][group][k] = {"en": ren, "ja": rja, "ko": rko}
+
+    return rendered
 
 
 def plainify_html(text: str) -> str:
@@ -513,7 +562,7 @@ CHAPTER = """
 """
 
 
-def render_plain(lang: lang_str_type) -> str:
+def render_plain(rendered: Rendered, lang: lang_str_type) -> str:
     # duplicated logic from index.html
     out = io.StringIO()
     out.write(HEADER)
@@ -549,15 +598,380 @@ def render_plain(lang: lang_str_type) -> str:
     return out.getvalue().strip("\n") + "\n"
 
 
-with open("DELTARUNE.txt", "w", encoding="utf-8") as f:
-    # CRLF for max compatibility (maybe somebody's using notepad.exe on Windows 7).
-    # BOM since it seems the most portable/reliable way to indicate encoding.
-    f.write("\N{BYTE ORDER MARK}" + render_plain("en").replace("\n", "\r\n"))
+def js_escape(as_json: str) -> str:
+    """Escapes JSON for a single-quoted JS string literal."""
+    return as_json.replace("\\", "\\\\").replace("'", "\\'")
+
+
+def write_rendered(rendered: Rendered) -> None:
+    # Mainly for reference in the git diff.
+    # Easier for other programs to ingest than the JS file below.
+    with open("rendered.json", "w", encoding="utf-8") as f:
+        json.dump(rendered, f, indent=0, ensure_ascii=False)
+
+    # https://v8.dev/blog/cost-of-javascript-2019#json
+    # TL;DR: JSON parsed from a string literal is faster than an object literal.
+    # This saves ~60ms in the node.js CLI on my laptop.
+    with open("rendered.json.js", "w", encoding="utf-8") as f:
+        as_json = json.dumps(
+            rendered, indent=None, ensure_ascii=False, separators=(",", ":")
+        )
+        f.write("var rendered = JSON.parse('")
+        f.write(js_escape(as_json))
+        f.write("');")
+
+    with open("DELTARUNE.txt", "w", encoding="utf-8") as f:
+        # CRLF for max compatibility (maybe somebody's using notepad.exe on Windows 7).
+        # BOM since it seems the most portable/reliable way to indicate encoding.
+        f.write("\N{BYTE ORDER MARK}" + render_plain(rendered, "en").replace("\n", "\r\n"))
+
+    with open("DELTARUNE_ja.txt", "w", encoding="utf-8") as f:
+        f.write("\N{BYTE ORDER MARK}" + render_plain(rendered, "ja").replace("\n", "\r\n"))
+
+    with open("DELTARUNE_ko.txt", "w", encoding="utf-8") as f:
+        f.write("\N{BYTE ORDER MARK}" + render_plain(rendered, "ko").replace("\n", "\r\n"))
+
+
+def estimate_lines(content: str) -> int:
+    """Lines in a textbox, not counting wrapping."""
+    return content.count("\n") + content.count('</div><div class="indented">') + 1
+
+
+def pack_bits(bits: list[bool]) -> str:
+    """Bit i is (byte i // 8) >> (i % 8) & 1, then base64."""
+    packed = bytearray((len(bits) + 7) // 8)
+    for i, bit in enumerate(bits):
+        if bit:
+            packed[i >> 3] |= 1 << (i & 7)
+    return base64.b64encode(packed).decode()
+
+
+def layout_index(rendered: Rendered) -> dict[str, typing.Any]:
+    """Precomputes which textboxes the page shows, so it doesn't have to build
+    them all to know how tall things are.
+
+    For each chapter there's the group order and message count per group, and
+    for each language in it:
+    - visible: which messages get a textbox when only this chapter is shown,
+      as a bitmap over the chapter's messages in page order (see pack_bits())
+    - visible_all: the same with chap=all, after skipping messages that are
+      identical to the last time they were shown in an earlier chapter
+    - lines: estimated line count of each message, one byte each, base64
+    - boxes/lines_total (and boxes_all/lines_total_all): per group sums
+      over the visible messages
+
+    Textboxes are per language, so a selection of several languages is the
+    sum (or union) of its languages. Same dedup logic as index.html and
+    render_plain().
+    """
+    layout: dict[str, typing.Any] = {}
+    dedup: dict[tuple[str, str], str] = {}
+    for chap, chapter in rendered.items():
+        layout[chap] = {
+            "groups": list(chapter),
+            "counts": [len(messages) for messages in chapter.values()],
+        }
+        for lang_code in typing.get_args(lang_str_type):
+            visible = []
+            visible_all = []
+            lines = bytearray()
+            boxes = []
+            boxes_all = []
+            lines_total = []
+            lines_total_all = []
+            for messages in chapter.values():
+                boxes.append(0)
+                boxes_all.append(0)
+                lines_total.append(0)
+                lines_total_all.append(0)
+                for key, contents in messages.items():
+                    content = contents.get(lang_code)
+                    count = estimate_lines(content) if content else 0
+                    shown_all = bool(content) and dedup.get((lang_code, key)) != content
+                    if shown_all:
+                        dedup[lang_code, key] = content
+                    visible.append(bool(content))
+                    visible_all.append(shown_all)
+                    lines.append(min(count, 255))
+                    if content:
+                        boxes[-1] += 1
+                        lines_total[-1] += count
+                    if shown_all:
+                        boxes_all[-1] += 1
+                        lines_total_all[-1] += count
+            layout[chap][lang_code] = {
+                "visible": pack_bits(visible),
+                "visible_all": pack_bits(visible_all),
+                "lines": base64.b64encode(lines).decode(),
+                "boxes": boxes,
+                "lines_total": lines_total,
+                "boxes_all": boxes_all,
+                "lines_total_all": lines_total_all,
+            }
+    return layout
+
+
+def write_layout(rendered: Rendered) -> None:
+    with open("layout.json", "w", encoding="utf-8") as f:
+        json.dump(
+            layout_index(rendered), f, ensure_ascii=False, separators=(",", ":")
+        )
+
+
+def js_size(value: typing.Any) -> int:
+    """How many bytes a value takes up in rendered.json.js."""
+    as_json = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return len(js_escape(as_json).encode())
+
+
+RE_MARKUP = re.compile(r"<[^>]+>|&(?:amp|lt|gt);")
+
+
+def markup_kind(markup: str) -> str:
+    if markup.startswith("&"):
+        return "entities"
+    if markup in ('<div class="indented">', "</div>"):
+        return "indented"
+    if markup.startswith(("<span", "</span")):
+        return "span"
+    return "other"
+
+
+def size_report(
+    rendered: Rendered, chapter_sourcemap: dict[str, dict[str, str]], top: int = 100
+) -> dict[str, typing.Any]:
+    """Breaks down where the bytes in rendered.json.js (and sourcemap.json) go.
+
+    Sizes are as written to rendered.json.js, i.e. UTF-8 after JSON and JS
+    escaping. Each message and group also counts its key and punctuation,
+    so the chapters add up to (almost exactly) the whole file. The markup
+    breakdown covers the whole file too: whatever isn't message contents
+    (keys, nulls for missing languages, quotes and the like) is "structure".
+    Only the top duplicated strings are listed.
+    """
+    chapters = {}
+    groups = []
+    languages: dict[str, int] = {}
+    markup = {
+        "text": 0,
+        "span": 0,
+        "indented": 0,
+        "entities": 0,
+        "other": 0,
+        "structure": 0,
+    }
+    seen: dict[tuple[str, str], int] = {}
+
+    for chap, chapter in rendered.items():
+        chapter_size = js_size(chap) + 3  # "1":{ } and a comma
+        for group, messages in chapter.items():
+            group_size = js_size(group) + 3
+            for key, contents in messages.items():
+                group_size += js_size(key) + js_size(contents) + 2
+                for lang_code, content in contents.items():
+                    if content is None:
+                        continue
+                    size = js_size(content)
+                    languages[lang_code] = languages.get(lang_code, 0) + size
+                    seen[lang_code, content] = seen.get((lang_code, content), 0) + 1
+                    text_size = size - 2  # Quotes
+                    for match in RE_MARKUP.finditer(content):
+                        markup_size = js_size(match.group()) - 2
+                        markup[markup_kind(match.group())] += markup_size
+                        text_size -= markup_size
+                    markup["text"] += text_size
+            chapter_size += group_size
+            groups.append(
+                {
+                    "chapter": chap,
+                    "group": group,
+                    "bytes": group_size,
+                    "messages": len(messages),
+                }
+            )
+        chapters[chap] = chapter_size
+
+    duplicates = [
+        {
+            "lang": lang_code,
+            "text": content,
+            "count": count,
+            "wasted_bytes": (count - 1) * (js_size(content) - 2),
+        }
+        for (lang_code, content), count in seen.items()
+        if count > 1
+    ]
+    duplicates.sort(key=lambda d: d["wasted_bytes"], reverse=True)
+    groups.sort(key=lambda g: g["bytes"], reverse=True)
+    total = js_size(rendered) + len("var rendered = JSON.parse('');")
+    markup["structure"] = total - sum(markup.values())
+
+    return {
+        "rendered.json.js": total,
+        "chapters": chapters,
+        "languages": languages,
+        "markup": markup,
+        "duplicates": {
+            "wasted_bytes": sum(d["wasted_bytes"] for d in duplicates),
+            "count": len(duplicates),
+            "strings": duplicates[:top],
+        },
+        "groups": groups,
+        "sourcemap.json": {
+            chap: len(
+                json.dumps(
+                    locations, indent=0, ensure_ascii=False, sort_keys=True
+                ).encode()
+            )
+            for chap, locations in chapter_sourcemap.items()
+        },
+    }
+
+
+def print_size_summary(report: dict[str, typing.Any], top: int = 10) -> None:
+    def kb(size: int) -> str:
+        return f"{size / 1024:,.0f} KiB"
+
+    total = report["rendered.json.js"]
+    print(f"rendered.json.js: {kb(total)}")
+    for name in ["chapters", "languages", "markup"]:
+        print(f"  by {name}: " + ", ".join(
+            f"{key} {kb(size)} ({size / total:.0%})"
+            for key, size in report[name].items()
+        ))
+    print(
+        f"  duplicated strings: {kb(report['duplicates']['wasted_bytes'])}"
+        f" ({report['duplicates']['count']} strings)"
+    )
+    print(f"  top {top} groups:")
+    for group in report["groups"][:top]:
+        print(
+            f"    {kb(group['bytes']):>9}  {group['chapter']}_{group['group']}"
+            f" ({group['messages']} messages)"
+        )
+    print(f"sourcemap.json: {kb(sum(report['sourcemap.json'].values()))}")
+
+
+def write_size_report(
+    path: str, rendered: Rendered, chapter_sourcemap: dict[str, dict[str, str]]
+) -> None:
+    report = size_report(rendered, chapter_sourcemap)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1, ensure_ascii=False)
+    print_size_summary(report)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE messages (
+    id INTEGER PRIMARY KEY,
+    chapter INTEGER NOT NULL,
+    grp TEXT NOT NULL,
+    key TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    raw TEXT,
+    html TEXT,
+    plain TEXT,
+    UNIQUE (chapter, key, lang)
+);
+CREATE TABLE sourcemap (
+    chapter INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    file TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    PRIMARY KEY (chapter, key)
+);
+CREATE INDEX messages_grp ON messages (grp);
+CREATE INDEX sourcemap_file ON sourcemap (file);
+-- Trigram tokens because neither Korean nor Japanese reliably split on spaces.
+-- Lets MATCH (and LIKE) find substrings of 3+ characters, e.g.:
+--   SELECT m.chapter, m.key, m.plain
+--   FROM messages_fts f JOIN messages m ON m.id = f.rowid
+--   WHERE messages_fts MATCH '크리스' AND m.lang = 'ko' AND m.grp LIKE 'obj_ch4%';
+-- MATCH finds nothing for terms shorter than 3 characters (e.g. '꿈'), those
+-- need a LIKE on the table itself (the trigram index can't help them either):
+--   SELECT chapter, key, plain FROM messages WHERE plain LIKE '%꿈%' AND lang = 'ko';
+CREATE VIRTUAL TABLE messages_fts USING fts5(
+    plain, content='messages', content_rowid='id', tokenize='trigram'
+);
+"""
+
+
+def write_sqlite(
+    path: str,
+    rendered: Rendered,
+    lang: Lang,
+    chapter_sourcemap: dict[str, dict[str, str]],
+) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+    db = sqlite3.connect(path)
+    # It's a build artifact, if we crash halfway we'll just write it again.
+    db.execute("PRAGMA journal_mode = OFF")
+    db.execute("PRAGMA synchronous = OFF")
+    db.executescript(SQLITE_SCHEMA)
+    with db:
+        db.executemany(
+            "INSERT INTO messages (chapter, grp, key, lang, raw, html, plain)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    int(chap),
+                    group,
+                    key,
+                    lang_code,
+                    lang[chap][lang_code].get(key),
+                    content,
+                    plainify_html(content) if content is not None else None,
+                )
+                for chap, groups in rendered.items()
+                for group, messages in groups.items()
+                for key, contents in messages.items()
+                for lang_code, content in contents.items()
+                if content is not None or lang[chap][lang_code].get(key) is not None
+            ),
+        )
+        db.executemany(
+            "INSERT INTO sourcemap (chapter, key, file, line) VALUES (?, ?, ?, ?)",
+            (
+                (int(chap), key, *location.rsplit(":", 1))
+                for chap, locations in chapter_sourcemap.items()
+                for key, location in locations.items()
+            ),
+        )
+        db.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+    db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sqlite",
+        metavar="PATH",
+        help="also write the messages to a SQLite database with a full-text index",
+    )
+    parser.add_argument(
+        "--size-report",
+        metavar="PATH",
+        help="also write a JSON breakdown of the output size and print a summary",
+    )
+    args = parser.parse_args()
+
+    with open("lang.json", encoding="utf-8") as f:
+        lang: Lang = json.load(f)
+    add_korean(lang)
+    with open("sourcemap.json", encoding="utf-8") as f:
+        chapter_sourcemap = json.load(f)
+
+    rendered = render_all(lang, chapter_sourcemap)
+    write_rendered(rendered)
+    write_layout(rendered)
+    if args.sqlite:
+        write_sqlite(args.sqlite, rendered, lang, chapter_sourcemap)
+    if args.size_report:
+        write_size_report(args.size_report, rendered, chapter_sourcemap)
 
-with open("DELTARUNE_ja.txt", "w", encoding="utf-8") as f:
-    f.write("\N{BYTE ORDER MARK}" + render_plain("ja").replace("\n", "\r\n"))
+    print("Text dump successfully generated.")
 
-with open("DELTARUNE_ko.txt", "w", encoding="utf-8") as f:
-    f.write("\N{BYTE ORDER MARK}" + render_plain("ko").replace("\n", "\r\n"))
 
-print("Text dump successfully generated.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
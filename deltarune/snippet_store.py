@@ -0,0 +1,95 @@
+"""A packed store of source code snippets around each text call.
+
+snippets.bin is every snippet's UTF-8 text back to back, and snippets.json
+maps chapter -> msgid -> [start, length, first line number] into it. That
+way looking up a snippet is a single seek (or a single HTTP Range request
+from the page) and nobody has to ship the whole CodeEntries tree.
+"""
+
+import json
+import mmap
+import pathlib
+import typing
+
+BIN_NAME = "snippets.bin"
+INDEX_NAME = "snippets.json"
+
+
+class Snippet(typing.NamedTuple):
+    first_line: int
+    text: str
+
+
+def cut_snippet(data: bytes, offset: int, context: int) -> tuple[int, bytes]:
+    """Returns ±context lines around the line starting at byte offset.
+
+    Also returns how many lines before the matched one were included.
+    """
+    start = offset
+    before = 0
+    while before < context and start > 0:
+        start = data.rfind(b"\n", 0, start - 1) + 1
+        before += 1
+    end = offset
+    for _ in range(context + 1):
+        newline = data.find(b"\n", end)
+        if newline == -1:
+            end = len(data)
+            break
+        end = newline + 1
+    return before, data[start:end]
+
+
+def write_store(
+    locations: dict[int, dict[str, tuple[str, int, int]]],
+    root: typing.Callable[[int], pathlib.Path],
+    context: int,
+    out: pathlib.Path = pathlib.Path("."),
+) -> None:
+    """Writes snippets.bin and snippets.json.
+
+    locations maps chapter -> msgid -> (filename, line number, byte offset),
+    and root(chapter) is the directory the filenames are relative to.
+    Snippets shared by several msgids (and chapters) are only stored once.
+    """
+    index: dict[int, dict[str, list[int]]] = {}
+    stored: dict[bytes, int] = {}
+    with open(out / BIN_NAME, "wb") as f:
+        for chapter, keys in locations.items():
+            index[chapter] = {}
+            by_file: dict[str, list[tuple[str, int, int]]] = {}
+            for key, (filename, lineno, offset) in keys.items():
+                by_file.setdefault(filename, []).append((key, lineno, offset))
+            for filename, entries in by_file.items():
+                data = (root(chapter) / filename).read_bytes()
+                for key, lineno, offset in entries:
+                    before, snippet = cut_snippet(data, offset, context)
+                    if snippet not in stored:
+                        stored[snippet] = f.tell()
+                        f.write(snippet)
+                    index[chapter][key] = [stored[snippet], len(snippet), lineno - before]
+    with open(out / INDEX_NAME, "w", encoding="utf-8") as f:
+        # Fetched by the page, so keep it compact.
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+
+
+class SnippetStore:
+    """Reads snippets from a store written by write_store()."""
+
+    def __init__(self, directory: pathlib.Path = pathlib.Path(".")) -> None:
+        with open(directory / INDEX_NAME, encoding="utf-8") as f:
+            self.index: dict[str, dict[str, list[int]]] = json.load(f)
+        with open(directory / BIN_NAME, "rb") as f:
+            # An empty file can't be mapped, but then there's nothing to read.
+            self.data: mmap.mmap | bytes = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if f.seek(0, 2)
+                else b""
+            )
+
+    def get(self, chapter: str | int, key: str) -> Snippet | None:
+        try:
+            start, length, first_line = self.index[str(chapter)][key]
+        except KeyError:
+            return None
+        return Snippet(first_line, self.data[start : start + length].decode())